@@ -5,19 +5,43 @@ This module implements a Model Context Protocol (MCP) server with SSE transport
 that connects Large Language Models to Wikidata's structured knowledge base.
 """
 import os
+import re
 import json
+import time
+import logging
 import asyncio
 import anyio
+import hashlib
+import threading
 import uvicorn
 import traceback
+from cachetools import LRUCache, TTLCache
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import Response, StreamingResponse
 from mcp.server.sse import SseServerTransport
 from mcp.server.fastmcp import FastMCP
-from datetime import datetime
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
 from uuid import uuid4
-from SPARQLWrapper import SPARQLWrapper, JSON
+
+# orjson is a C-backed JSON codec, 2-5x faster than the stdlib on the large
+# SPARQL payloads the tools return; fall back to stdlib json when unavailable
+try:
+    import orjson
+
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+
+    _loads = orjson.loads
+    _HAS_ORJSON = True
+except ImportError:
+    def _dumps(obj) -> str:
+        return json.dumps(obj)
+
+    _loads = json.loads
+    _HAS_ORJSON = False
 
 from mcp.server.fastmcp.prompts import base
 from starlette.routing import Route, Mount
@@ -26,200 +50,662 @@ from wikidata_api import (
     search_property,
     get_entity_metadata,
     get_entity_properties,
-    execute_sparql
+    execute_sparql,
+    search_entity_async,
+    search_property_async,
+    get_entity_metadata_async,
+    execute_sparql_async,
+    execute_sparql_raw_async,
+    execute_sparql_stream
 )
+from sse_starlette.sse import EventSourceResponse
+
+logger = logging.getLogger(__name__)
+
+# Reading a request body just to log it costs a full copy per message, so
+# body logging is opt-in via the environment.
+_DEBUG_BODY = os.environ.get("WIKIDATA_MCP_DEBUG_BODY", "").lower() in ("1", "true", "yes")
 
 # Initialize FastMCP
 mcp = FastMCP(name="Wikidata Knowledge")
 
+# ============= RESULT CACHES =============
+
+# Process-local caches so repeated lookups (e.g. "Albert Einstein" -> Q937)
+# don't re-hit Wikidata on every call. Labels/descriptions are stable, so
+# metadata can live for a day; search results get a shorter TTL.
+_SEARCH_CACHE = TTLCache(maxsize=10_000, ttl=3600)       # normalized query -> entity/property ID
+_METADATA_CACHE = TTLCache(maxsize=10_000, ttl=86400)    # entity ID -> metadata dict
+_NEGATIVE_CACHE = TTLCache(maxsize=2_000, ttl=300)       # normalized query -> not-found sentinel
+_CACHE_LOCK = threading.Lock()
+_CACHE_STATS = {"hits": 0, "misses": 0}
+
+_NOT_FOUND = "NOT_FOUND"
+
+# Cache for SPARQL query results, keyed by a hash of the canonicalized query
+# so logically-equivalent queries (different whitespace/comments/keyword case)
+# collapse to one entry.
+_SPARQL_CACHE = TTLCache(maxsize=2048, ttl=3600)
+
+# Per-key locks so concurrent identical queries collapse into one fetch:
+# the first task runs the query, the rest wait and then read the cache.
+_SPARQL_INFLIGHT = {}
+
+def _inflight_lock(cache_key) -> asyncio.Lock:
+    lock = _SPARQL_INFLIGHT.get(cache_key)
+    if lock is None:
+        lock = _SPARQL_INFLIGHT.setdefault(cache_key, asyncio.Lock())
+    return lock
+
+# Single pattern handling all three normalizations: string literals,
+# variables, IRIs and prefixed names are matched first and kept verbatim
+# (so '#', spaces and keyword-shaped names inside them are untouched and
+# stay case-sensitive), runs of whitespace/comments collapse to one space,
+# and genuinely free-standing SPARQL keywords are uppercased. The first
+# group must be preserved: uppercasing `?a`, a path segment or a local
+# name like `ex:by` would make distinct queries share a cache key and
+# serve each other's results.
+_SPARQL_CANON_RE = re.compile(
+    r"(?P<keep>'''.*?'''|\"\"\".*?\"\"\"|'[^'\n]*'|\"[^\"\n]*\""
+    r"|\?\w+|\$\w+|<[^>]*>|\w*:\w+)"
+    r"|(?P<drop>(?:\s|#[^\n]*)+)"
+    r"|\b(?P<kw>select|where|filter|limit|order|group|having|optional|union|"
+    r"service|prefix|distinct|reduced|ask|construct|describe|bind|values|"
+    r"minus|graph|offset|by|as|exists|not|in|a)\b",
+    re.IGNORECASE | re.DOTALL,
+)
+
+def _canonicalize_sparql(query: str) -> str:
+    """
+    Normalize a SPARQL query for cache-key purposes: strip comments, collapse
+    whitespace and uppercase keywords, leaving string literals, variables,
+    IRIs and prefixed names untouched. All three rewrites happen in one pass
+    over the query.
+    """
+    def _repl(m):
+        if m.group("keep") is not None:
+            return m.group("keep")
+        if m.group("drop") is not None:
+            return " "
+        return m.group("kw").upper()
+
+    return _SPARQL_CANON_RE.sub(_repl, query).strip()
+
+def _sparql_cache_key(query: str) -> str:
+    return hashlib.blake2b(
+        _canonicalize_sparql(query).encode("utf-8"), digest_size=16
+    ).hexdigest()
+
+# ============= SPARQL VALIDATION =============
+
+# Queries that already validated cleanly, keyed by content hash, so the
+# templated queries the composite tools re-issue skip the full scan.
+# Failures are not cached: they return early anyway, and a bad query must
+# never get stuck reading as invalid after an edit collides with it.
+_VALIDATED = LRUCache(maxsize=4096)
+
+# When rdflib is installed its SPARQL grammar gives real parse errors
+# instead of heuristics; the single-pass scan below remains the fallback.
+# Validated queries are cached, so the parse cost is paid once per query.
+try:
+    from rdflib.plugins.sparql.parser import parseQuery as _parse_sparql
+except ImportError:
+    _parse_sparql = None
+
+# pyparsing, which backs rdflib's grammar, keeps mutable per-parse state on
+# the shared parser objects and is not thread-safe; the validator runs on
+# worker threads, so concurrent parses of valid queries can return garbage
+# errors. Serialize the parse — validated queries are cached above, so the
+# lock is only contended for first-time queries.
+_PARSE_LOCK = threading.Lock()
+
+_BRACKET_PAIRS = {')': '(', ']': '[', '}': '{'}
+
+def _scan_sparql(query: str) -> str:
+    """
+    Walk the query once, tracking string-literal and comment context, and
+    report unbalanced brackets or an unterminated string. A single pass
+    replaces separate quote counts, comment stripping and bracket checks,
+    and quotes inside comments or literals can no longer confuse it.
+
+    Returns:
+        An error message, or None if the query scans cleanly.
+    """
+    stack = []
+    in_string = False
+    string_char = ''
+    string_start = -1
+    in_comment = False
+    escaped = False
+    for pos, ch in enumerate(query):
+        if in_comment:
+            if ch == '\n':
+                in_comment = False
+        elif in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == string_char:
+                in_string = False
+        elif ch == '#':
+            in_comment = True
+        elif ch == '"' or ch == "'":
+            in_string = True
+            string_char = ch
+            string_start = pos
+        elif ch in '([{':
+            stack.append(ch)
+        elif ch in ')]}':
+            if not stack or stack[-1] != _BRACKET_PAIRS[ch]:
+                return f"Unbalanced brackets in SPARQL query: unexpected '{ch}' at position {pos}"
+            stack.pop()
+    if in_string:
+        kind = "double" if string_char == '"' else "single"
+        return (f"Unbalanced {kind} quotes in SPARQL query: "
+                f"string opened at position {string_start} is never closed")
+    if stack:
+        return f"Unbalanced brackets in SPARQL query: '{stack[-1]}' is never closed"
+    return None
+
+def _validate_sparql_query(query: str) -> dict:
+    """
+    Run lightweight syntax checks on a SPARQL query before sending it to the
+    endpoint.
+
+    Returns:
+        {"is_valid": True} when the query passes, otherwise a dict with an
+        "error" message describing the problem.
+    """
+    key = hashlib.blake2b(query.encode("utf-8"), digest_size=16).digest()
+    with _CACHE_LOCK:
+        if _VALIDATED.get(key):
+            return {"is_valid": True}
+
+    if _parse_sparql is not None:
+        try:
+            with _PARSE_LOCK:
+                _parse_sparql(query)
+        except Exception as e:
+            return {"error": f"SPARQL syntax error: {e}"}
+    else:
+        scan_error = _scan_sparql(query)
+        if scan_error:
+            return {"error": scan_error}
+
+        # Check for common syntax issues with FILTER. Only a heuristic, so
+        # it must not overrule the grammar parse above: valid queries like
+        # FILTER(CONTAINS(str(?l), "foo")) trip the substring check.
+        if 'FILTER(' in query and 'CONTAINS' in query:
+            # Check for potential issues with quotes in CONTAINS
+            if 'CONTAINS(str(' in query and '")' in query:
+                return {"error": "Possible quote issue in CONTAINS. Use single quotes inside double quotes or escape properly."}
+
+    with _CACHE_LOCK:
+        _VALIDATED[key] = True
+    return {"is_valid": True}
+
+def _search_cache_get(key, not_found_message: str):
+    """Return a cached search result (positive or negative), or None on a miss."""
+    with _CACHE_LOCK:
+        if key in _NEGATIVE_CACHE:
+            _CACHE_STATS["hits"] += 1
+            return not_found_message
+        if key in _SEARCH_CACHE:
+            _CACHE_STATS["hits"] += 1
+            return _SEARCH_CACHE[key]
+        _CACHE_STATS["misses"] += 1
+    return None
+
+def _search_cache_put(key, result: str, not_found_message: str):
+    """Cache successful IDs and "not found" results; transient errors are not cached."""
+    with _CACHE_LOCK:
+        if result == not_found_message:
+            _NEGATIVE_CACHE[key] = _NOT_FOUND
+        elif not result.startswith("Error"):
+            _SEARCH_CACHE[key] = result
+
+def _cached_search(kind: str, query: str, search_func, not_found_message: str) -> str:
+    key = (kind, query.strip().casefold())
+    cached = _search_cache_get(key, not_found_message)
+    if cached is not None:
+        return cached
+    result = search_func(query)
+    _search_cache_put(key, result, not_found_message)
+    return result
+
+def _cached_search_entity(query: str) -> str:
+    return _cached_search("entity", query, search_entity, "No entity found")
+
+def _cached_search_property(query: str) -> str:
+    return _cached_search("property", query, search_property, "No property found")
+
+def _cached_get_metadata(entity_id: str) -> dict:
+    key = entity_id.strip().upper()
+    with _CACHE_LOCK:
+        if key in _METADATA_CACHE:
+            _CACHE_STATS["hits"] += 1
+            return _METADATA_CACHE[key]
+        _CACHE_STATS["misses"] += 1
+    metadata = get_entity_metadata(key)
+    if "error" not in metadata:
+        with _CACHE_LOCK:
+            _METADATA_CACHE[key] = metadata
+        _record_recent_entity(key)
+    return metadata
+
+async def _cached_search_entity_async(query: str) -> str:
+    key = ("entity", query.strip().casefold())
+    cached = _search_cache_get(key, "No entity found")
+    if cached is not None:
+        return cached
+    result = await search_entity_async(query)
+    _search_cache_put(key, result, "No entity found")
+    return result
+
+async def _cached_search_property_async(query: str) -> str:
+    key = ("property", query.strip().casefold())
+    cached = _search_cache_get(key, "No property found")
+    if cached is not None:
+        return cached
+    result = await search_property_async(query)
+    _search_cache_put(key, result, "No property found")
+    return result
+
+async def _cached_get_metadata_async(entity_id: str) -> dict:
+    key = entity_id.strip().upper()
+    with _CACHE_LOCK:
+        if key in _METADATA_CACHE:
+            _CACHE_STATS["hits"] += 1
+            return _METADATA_CACHE[key]
+        _CACHE_STATS["misses"] += 1
+    metadata = await get_entity_metadata_async(key)
+    if "error" not in metadata:
+        with _CACHE_LOCK:
+            _METADATA_CACHE[key] = metadata
+        _record_recent_entity(key)
+    return metadata
+
+# ============= CACHE PRE-WARMING =============
+
+# Rolling list of recently queried entity IDs, persisted across restarts so
+# the metadata cache can be re-warmed for the entities clients actually use.
+_CACHE_DIR = ".wikidata_cache"
+_TOP_ENTITIES_FILE = os.path.join(_CACHE_DIR, "top_entities.json")
+_RECENT_ENTITIES_MAX = 100
+_RECENT_ENTITIES = OrderedDict()  # entity ID -> None, most recent last
+
+def _record_recent_entity(entity_id: str):
+    with _CACHE_LOCK:
+        _RECENT_ENTITIES[entity_id] = None
+        _RECENT_ENTITIES.move_to_end(entity_id)
+        while len(_RECENT_ENTITIES) > _RECENT_ENTITIES_MAX:
+            _RECENT_ENTITIES.popitem(last=False)
+
+def _load_top_entities() -> list:
+    try:
+        with open(_TOP_ENTITIES_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+def _save_top_entities():
+    try:
+        os.makedirs(_CACHE_DIR, exist_ok=True)
+        with _CACHE_LOCK:
+            entity_ids = list(_RECENT_ENTITIES)
+        with open(_TOP_ENTITIES_FILE, "w") as f:
+            json.dump(entity_ids, f)
+    except OSError as e:
+        logger.warning("Could not persist top entities: %s", e)
+
+async def _prewarm():
+    """
+    Pre-populate the caches with the common-properties list and recently
+    seen entities, so the first real requests don't pay cold-start latency.
+    """
+    sem = asyncio.Semaphore(5)
+
+    async def warm(coro):
+        async with sem:
+            try:
+                await coro
+            except Exception as e:
+                logger.warning("Cache prewarm error: %s", e)
+
+    tasks = [
+        warm(_cached_search_property_async(name))
+        for name in _COMMON_PROPERTIES["properties"].values()
+    ]
+    tasks += [
+        warm(_cached_get_metadata_async(entity_id))
+        for entity_id in _load_top_entities()
+    ]
+    await asyncio.gather(*tasks)
+    logger.info("Cache prewarm complete: %d lookups", len(tasks))
+
 # ============= MCP TOOLS =============
 
 @mcp.tool()
-def search_wikidata_entity(query: str) -> str:
+async def search_wikidata_entity(query: str) -> str:
     """
     Search for a Wikidata entity by name.
-    
+
     Args:
         query: The name of the entity to search for (e.g., "Albert Einstein")
-        
+
     Returns:
         The Wikidata entity ID (e.g., Q937) or an error message
     """
-    return search_entity(query)
+    return await _cached_search_entity_async(query)
 
 @mcp.tool()
-def search_wikidata_property(query: str) -> str:
+async def search_wikidata_property(query: str) -> str:
     """
     Search for a Wikidata property by name.
-    
+
     Args:
         query: The name of the property to search for (e.g., "instance of")
-        
+
     Returns:
         The Wikidata property ID (e.g., P31) or an error message
     """
-    return search_property(query)
+    return await _cached_search_property_async(query)
 
 @mcp.tool()
-def get_wikidata_metadata(entity_id: str) -> str:
+async def get_wikidata_metadata(entity_id: str) -> str:
     """
     Get metadata (label and description) for a Wikidata entity.
-    
+
     Args:
         entity_id: The Wikidata entity ID (e.g., Q937)
-        
+
     Returns:
         JSON string containing the entity's label and description
     """
-    metadata = get_entity_metadata(entity_id)
-    return json.dumps(metadata)
+    metadata = await _cached_get_metadata_async(entity_id)
+    return _dumps(metadata)
 
 @mcp.tool()
-def get_wikidata_properties(entity_id: str) -> str:
+async def get_wikidata_properties(entity_id: str) -> str:
     """
     Get all properties for a Wikidata entity.
-    
+
     Args:
         entity_id: The Wikidata entity ID (e.g., Q937)
-        
+
     Returns:
         JSON string containing the entity's properties and their values
     """
-    properties = get_entity_properties(entity_id)
-    return json.dumps(properties)
+    # Property listings are as stable as metadata, so they share the
+    # day-long metadata cache under a distinct key shape
+    cache_key = ("properties", entity_id)
+    with _CACHE_LOCK:
+        cached = _METADATA_CACHE.get(cache_key)
+        if cached is not None:
+            _CACHE_STATS["hits"] += 1
+            return cached
+        _CACHE_STATS["misses"] += 1
+
+    # get_entity_properties is a blocking call, so run it on a worker
+    # thread to keep the event loop free
+    properties = await anyio.to_thread.run_sync(get_entity_properties, entity_id)
+    result = _dumps(properties)
+    if isinstance(properties, dict) and "error" not in properties:
+        with _CACHE_LOCK:
+            _METADATA_CACHE[cache_key] = result
+    return result
 
 @mcp.tool("execute_wikidata_sparql")
-def execute_wikidata_sparql(sparql_query: str) -> str:
+async def execute_wikidata_sparql(sparql_query: str) -> str:
     """
     Execute a SPARQL query against Wikidata.
-    
+
     Args:
         sparql_query: The SPARQL query to execute.
-        
+
     Returns:
         The results of the SPARQL query.
     """
     try:
-        # Validate the query for common syntax errors
-        if '"' in sparql_query and not sparql_query.count('"') % 2 == 0:
-            return json.dumps({"error": "Unbalanced double quotes in SPARQL query"})
-        
-        if "'" in sparql_query and not sparql_query.count("'") % 2 == 0:
-            return json.dumps({"error": "Unbalanced single quotes in SPARQL query"})
-        
-        # Check for common syntax issues with FILTER
-        if 'FILTER(' in sparql_query and 'CONTAINS' in sparql_query:
-            # Check for potential issues with quotes in CONTAINS
-            if 'CONTAINS(str(' in sparql_query and '")' in sparql_query:
-                return json.dumps({"error": "Possible quote issue in CONTAINS. Use single quotes inside double quotes or escape properly."})
-        
-        # Use the imported execute_sparql function from wikidata_api.py
-        result = execute_sparql(sparql_query)
-        
-        # Convert the result to a dictionary if it's a string (JSON)
-        if isinstance(result, str):
-            try:
-                result_dict = json.loads(result)
-                
+        # Validate the query for common syntax errors; the scan is linear in
+        # query size, so large queries run on a worker thread too
+        validation = await anyio.to_thread.run_sync(_validate_sparql_query, sparql_query)
+        if "error" in validation:
+            return _dumps(validation)
+
+        # Check the result cache before hitting the endpoint; the key is a
+        # hash of the canonicalized query so formatting differences still hit.
+        cache_key = _sparql_cache_key(sparql_query)
+        with _CACHE_LOCK:
+            cached = _SPARQL_CACHE.get(cache_key)
+        if cached is not None:
+            logger.debug("SPARQL cache HIT: %s", cache_key)
+            return cached
+        logger.debug("SPARQL cache MISS: %s", cache_key)
+
+        lock = _inflight_lock(cache_key)
+        try:
+            async with lock:
+                # Re-check: another task may have populated the cache while
+                # we waited on the lock
+                with _CACHE_LOCK:
+                    cached = _SPARQL_CACHE.get(cache_key)
+                if cached is not None:
+                    logger.debug("SPARQL cache HIT (coalesced): %s", cache_key)
+                    return cached
+
+                # Fetch the parsed result structure directly; checking for
+                # errors on the dict and serializing once avoids the old
+                # text -> parse -> text round-trip on large payloads
+                result_dict = await execute_sparql_raw_async(sparql_query)
+
                 # Check if the result contains an error
-                if isinstance(result_dict, dict) and 'error' in result_dict:
-                    print(f"SPARQL Query Error: {result_dict}")
-                    
+                if 'error' in result_dict:
+                    logger.error("SPARQL Query Error: %s", result_dict)
+
                     # Enhanced error message with query details
                     error_msg = result_dict.get('error', 'Unknown error')
                     error_type = result_dict.get('error_type', 'Unknown error type')
                     query = result_dict.get('query', 'Query not available')
-                    
+
                     # Return a more user-friendly error message as JSON string
-                    return json.dumps({
+                    return _dumps({
                         "error": error_msg,
                         "details": f"Error Type: {error_type}\nQuery: {query}",
                         "suggestion": "Try simplifying your query or check for syntax errors."
                     })
-                
+
+                result = _dumps(result_dict)
+
+                # Cache successful results only, so transient failures retry
+                with _CACHE_LOCK:
+                    _SPARQL_CACHE[cache_key] = result
+
                 # Return the result dictionary as a JSON string
                 return result
-            except json.JSONDecodeError:
-                return json.dumps({"result": result})
-        # The result is already a JSON string from execute_sparql
-        return result
+        finally:
+            _SPARQL_INFLIGHT.pop(cache_key, None)
     except Exception as e:
         error_message = str(e)
-        print(f"Exception in execute_wikidata_sparql: {error_message}")
+        logger.error("Exception in execute_wikidata_sparql: %s", error_message)
         
         # Provide more helpful error messages for common issues
         if "Lexical error" in error_message and "Encountered: " in error_message:
-            return json.dumps({"error": f"SPARQL syntax error: {error_message}. Check for unescaped quotes or special characters."})
-        return json.dumps({"error": f"Error executing SPARQL query: {error_message}"})
+            return _dumps({"error": f"SPARQL syntax error: {error_message}. Check for unescaped quotes or special characters."})
+        return _dumps({"error": f"Error executing SPARQL query: {error_message}"})
+
+@mcp.tool()
+async def batch_execute_wikidata_sparql(sparql_queries: list[str], max_workers: int = 10) -> str:
+    """
+    Execute several SPARQL queries against Wikidata concurrently.
+
+    Args:
+        sparql_queries: The SPARQL queries to execute
+        max_workers: Maximum number of queries in flight at once
+
+    Returns:
+        A JSON string containing one result per query, in input order
+    """
+    sem = asyncio.Semaphore(max_workers)
+
+    async def run_one(query: str) -> str:
+        validation = _validate_sparql_query(query)
+        if "error" in validation:
+            return _dumps(validation)
+
+        # Shared with execute_wikidata_sparql, so repeated queries across
+        # batches (and duplicates within one) resolve from the cache
+        cache_key = _sparql_cache_key(query)
+        with _CACHE_LOCK:
+            cached = _SPARQL_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+
+        lock = _inflight_lock(cache_key)
+        try:
+            async with lock:
+                with _CACHE_LOCK:
+                    cached = _SPARQL_CACHE.get(cache_key)
+                if cached is not None:
+                    return cached
+
+                async with sem:
+                    result = await execute_sparql_async(query)
+
+                try:
+                    result_dict = _loads(result)
+                    if not (isinstance(result_dict, dict) and 'error' in result_dict):
+                        with _CACHE_LOCK:
+                            _SPARQL_CACHE[cache_key] = result
+                except ValueError:
+                    pass
+                return result
+        finally:
+            _SPARQL_INFLIGHT.pop(cache_key, None)
+
+    results = await asyncio.gather(*(run_one(q) for q in sparql_queries))
+    return _dumps(list(results))
+
+# Prepared SPARQL templates for the composite tools. Everything except the
+# interpolated IDs is constant, so queries are assembled by concatenating
+# precomputed chunks, and results are cached under a (template, args) key
+# without re-canonicalizing the full query text.
+_FACTS_BY_PROP_PREFIX = """
+        SELECT ?value ?valueLabel
+        WHERE {
+          wd:"""
+_FACTS_BY_PROP_MID = " wdt:"
+_FACTS_BY_PROP_SUFFIX = """ ?value.
+          SERVICE wikibase:label { bd:serviceParam wikibase:language "en". }
+        }
+        """
+
+_FACTS_GENERAL_PREFIX = """
+        SELECT ?property ?propertyLabel ?value ?valueLabel
+        WHERE {
+          {
+            SELECT ?property ?value
+            WHERE {
+              wd:"""
+_FACTS_GENERAL_SUFFIX = """ ?p ?value.
+              ?property wikibase:directClaim ?p.
+            }
+            LIMIT 10
+          }
+          SERVICE wikibase:label { bd:serviceParam wikibase:language "en". }
+        }
+        """
+
+_RELATED_BY_PROP_PREFIX = """
+        SELECT ?related ?relatedLabel
+        WHERE {
+          wd:"""
+_RELATED_BY_PROP_MID = " wdt:"
+_RELATED_BY_PROP_SUFFIX = """ ?related.
+          SERVICE wikibase:label { bd:serviceParam wikibase:language "en". }
+        }
+        LIMIT """
+
+_RELATED_GENERAL_PREFIX = """
+        SELECT ?relation ?relationLabel ?related ?relatedLabel
+        WHERE {
+          wd:"""
+_RELATED_GENERAL_SUFFIX = """ ?p ?related.
+          ?property wikibase:directClaim ?p.
+          BIND(?property as ?relation)
+
+          # Filter out some common non-entity relations
+          FILTER(STRSTARTS(STR(?related), "http://www.wikidata.org/entity/"))
+
+          SERVICE wikibase:label { bd:serviceParam wikibase:language "en". }
+        }
+        LIMIT """
 
 @mcp.tool()
-def find_entity_facts(entity_name: str, property_name: str = None) -> str:
+async def find_entity_facts(entity_name: str, property_name: str = None) -> str:
     """
     Search for an entity and find its facts, optionally filtering by a property.
-    
+
     Args:
         entity_name: The name of the entity to search for
         property_name: Optional name of a property to filter by
-        
+
     Returns:
         A JSON string containing the entity facts
     """
-    # Search for the entity
-    entity_id = search_entity(entity_name)
-    if entity_id == "No entity found":
-        return json.dumps({"error": f"No entity found for '{entity_name}'"})
-    
-    # Get metadata
-    metadata = get_entity_metadata(entity_id)
-    
-    # If a property is specified, search for it
-    property_id = None
+    # Search for the entity and the optional property concurrently; the
+    # lookups are independent, so the pair costs one round-trip, not two
     if property_name:
-        property_id = search_property(property_name)
-        if property_id == "No property found":
-            return json.dumps({
-                "entity": metadata,
-                "error": f"No property found for '{property_name}'"
-            })
-    
-    # Build and execute SPARQL query
+        entity_id, property_id = await asyncio.gather(
+            _cached_search_entity_async(entity_name),
+            _cached_search_property_async(property_name)
+        )
+    else:
+        entity_id = await _cached_search_entity_async(entity_name)
+        property_id = None
+
+    if entity_id == "No entity found":
+        return _dumps({"error": f"No entity found for '{entity_name}'"})
+
+    if property_name and property_id == "No property found":
+        metadata = await _cached_get_metadata_async(entity_id)
+        return _dumps({
+            "entity": metadata,
+            "error": f"No property found for '{property_name}'"
+        })
+
+    # Build the SPARQL query from the prepared template chunks
     if property_id:
         # Specific property query
-        sparql_query = f"""
-        SELECT ?value ?valueLabel
-        WHERE {{
-          wd:{entity_id} wdt:{property_id} ?value.
-          SERVICE wikibase:label {{ bd:serviceParam wikibase:language "en". }}
-        }}
-        """
+        sparql_query = (_FACTS_BY_PROP_PREFIX + entity_id
+                        + _FACTS_BY_PROP_MID + property_id
+                        + _FACTS_BY_PROP_SUFFIX)
     else:
-        # General entity info query
-        sparql_query = f"""
-        SELECT ?property ?propertyLabel ?value ?valueLabel
-        WHERE {{
-          wd:{entity_id} ?p ?statement.
-          ?statement ?ps ?value.
-          
-          ?property wikibase:claim ?p.
-          ?property wikibase:statementProperty ?ps.
-          
-          SERVICE wikibase:label {{ bd:serviceParam wikibase:language "en". }}
-        }}
-        LIMIT 10
-        """
-    
-    # Get facts using the execute_sparql function
-    facts = execute_sparql(sparql_query)
-    
-    # Handle the facts based on its type
-    if isinstance(facts, str):
-        try:
-            facts_data = json.loads(facts)
-        except json.JSONDecodeError:
-            facts_data = {"raw": facts}
+        # General entity info query. Direct (truthy) claims avoid the
+        # statement-reification join, and the label service only sees the
+        # 10 rows the inner subquery keeps, which is far cheaper on WDQS.
+        sparql_query = (_FACTS_GENERAL_PREFIX + entity_id
+                        + _FACTS_GENERAL_SUFFIX)
+
+    facts_key = ("facts", entity_id, property_id)
+    with _CACHE_LOCK:
+        facts_data = _SPARQL_CACHE.get(facts_key)
+
+    if facts_data is not None:
+        metadata = await _cached_get_metadata_async(entity_id)
     else:
-        facts_data = facts
-    
+        # Fetch metadata and facts concurrently over the pooled client; the
+        # raw variant returns a dict directly, so the facts are embedded
+        # without a parse-and-reserialize round trip
+        metadata, facts_data = await asyncio.gather(
+            _cached_get_metadata_async(entity_id),
+            execute_sparql_raw_async(sparql_query)
+        )
+        if "error" not in facts_data:
+            with _CACHE_LOCK:
+                _SPARQL_CACHE[facts_key] = facts_data
+
     # Combine all results
     result = {
         "entity": metadata,
@@ -228,10 +714,10 @@ def find_entity_facts(entity_name: str, property_name: str = None) -> str:
     }
     
     # Return as JSON string
-    return json.dumps(result)
+    return _dumps(result)
 
 @mcp.tool()
-def get_related_entities(entity_id: str, relation_property: str = None, limit: int = 10) -> str:
+async def get_related_entities(entity_id: str, relation_property: str = None, limit: int = 10) -> str:
     """
     Find entities related to the given entity, optionally by a specific relation.
     
@@ -245,53 +731,37 @@ def get_related_entities(entity_id: str, relation_property: str = None, limit: i
     """
     if relation_property:
         # Query for specific relation
-        sparql_query = f"""
-        SELECT ?related ?relatedLabel
-        WHERE {{
-          wd:{entity_id} wdt:{relation_property} ?related.
-          SERVICE wikibase:label {{ bd:serviceParam wikibase:language "en". }}
-        }}
-        LIMIT {limit}
-        """
+        sparql_query = (_RELATED_BY_PROP_PREFIX + entity_id
+                        + _RELATED_BY_PROP_MID + relation_property
+                        + _RELATED_BY_PROP_SUFFIX + str(limit))
     else:
         # Query for any relation
-        sparql_query = f"""
-        SELECT ?relation ?relationLabel ?related ?relatedLabel
-        WHERE {{
-          wd:{entity_id} ?p ?related.
-          ?property wikibase:directClaim ?p.
-          BIND(?property as ?relation)
-          
-          # Filter out some common non-entity relations
-          FILTER(STRSTARTS(STR(?related), "http://www.wikidata.org/entity/"))
-          
-          SERVICE wikibase:label {{ bd:serviceParam wikibase:language "en". }}
-        }}
-        LIMIT {limit}
-        """
-    
-    # Get related entities using the execute_sparql function
-    related_entities = execute_sparql(sparql_query)
-    
-    # Handle the result based on its type
-    if isinstance(related_entities, str):
-        # It's already a JSON string, return as is
-        return related_entities
-    else:
-        # It's a dictionary, convert to JSON string
-        try:
-            return json.dumps(related_entities)
-        except Exception as e:
-            return json.dumps({"error": f"Error serializing result: {str(e)}", "raw": str(related_entities)})
+        sparql_query = (_RELATED_GENERAL_PREFIX + entity_id
+                        + _RELATED_GENERAL_SUFFIX + str(limit))
+
+    related_key = ("related", entity_id, relation_property, limit)
+    with _CACHE_LOCK:
+        cached = _SPARQL_CACHE.get(related_key)
+    if cached is not None:
+        return cached
+
+    # execute_sparql already returns a JSON string, so pass it through as is;
+    # the blocking call runs on a worker thread to keep the event loop free
+    result = await anyio.to_thread.run_sync(execute_sparql, sparql_query)
+    try:
+        if "error" not in _loads(result):
+            with _CACHE_LOCK:
+                _SPARQL_CACHE[related_key] = result
+    except ValueError:
+        pass
+    return result
 
 # ============= MCP RESOURCES =============
 
-@mcp.resource("wikidata://common-properties")
-def common_properties_resource():
-    """
-    Provides a list of commonly used Wikidata properties.
-    """
-    return {
+# These payloads are static, so they are built once at import time and the
+# resource handlers just return the shared objects instead of reallocating
+# the same dicts on every request.
+_COMMON_PROPERTIES = {
         "properties": {
             "P31": "instance of",
             "P279": "subclass of",
@@ -317,32 +787,118 @@ def common_properties_resource():
         "description": "Common Wikidata properties that can be used to query for specific information about entities."
     }
 
-@mcp.resource("wikidata://sparql-examples")
-def sparql_examples_resource():
+# Serialize the static reference resources once: returning the prebuilt
+# JSON string means a fetch is a buffer send, not a dict encode.
+_COMMON_PROPERTIES_JSON = _dumps(_COMMON_PROPERTIES)
+
+@mcp.resource("wikidata://common-properties")
+def common_properties_resource() -> str:
     """
-    Provides example SPARQL queries for common Wikidata tasks.
+    Provides a list of commonly used Wikidata properties.
+    """
+    return _COMMON_PROPERTIES_JSON
+
+@mcp.resource("wikidata://cache-stats")
+def cache_stats_resource():
+    """
+    Provides hit/miss statistics and entry counts for the in-process caches.
     """
-    return {
-        "examples": [
+    with _CACHE_LOCK:
+        return {
+            "hits": _CACHE_STATS["hits"],
+            "misses": _CACHE_STATS["misses"],
+            "search_entries": len(_SEARCH_CACHE),
+            "metadata_entries": len(_METADATA_CACHE),
+            "negative_entries": len(_NEGATIVE_CACHE),
+            "description": "Statistics for the entity/property search and metadata caches."
+        }
+
+def _resolve_labels(qids: list[str]) -> str:
+    """
+    Resolve English labels for a batch of entity IDs in one query.
+
+    Companion to the "query_fast" example variants: run the fast query
+    first, then hydrate labels for the QIDs you actually need.
+    """
+    values = " ".join(f"wd:{qid}" for qid in qids)
+    query = f"""
+    SELECT ?entity ?label
+    WHERE {{
+      VALUES ?entity {{ {values} }}
+      ?entity rdfs:label ?label.
+      FILTER(LANG(?label) = "en")
+    }}
+    """
+    return execute_sparql(query)
+
+_LABEL_ID_RE = re.compile(r"^[QP]\d+$")
+
+@mcp.tool()
+async def get_wikidata_labels(entity_ids: list[str]) -> str:
+    """
+    Resolve English labels for a batch of Wikidata entity IDs in one query.
+
+    Companion to the query_fast examples in the sparql-examples resource:
+    run the fast query first, then hydrate labels for the QIDs you need.
+
+    Args:
+        entity_ids: The Wikidata entity IDs to label (e.g., ["Q937", "Q5"])
+
+    Returns:
+        The SPARQL results mapping each entity to its English label
+    """
+    qids = [entity_id.strip().upper() for entity_id in entity_ids]
+    bad = [qid for qid in qids if not _LABEL_ID_RE.match(qid)]
+    if bad:
+        return _dumps({"error": f"Invalid entity IDs: {', '.join(bad)}"})
+    if not qids:
+        return _dumps({"error": "No entity IDs provided"})
+    # execute_sparql is a blocking call, so run it on a worker thread
+    return await anyio.to_thread.run_sync(_resolve_labels, qids)
+
+# The examples list is a tuple of shared dicts: the resource is read-only,
+# and an immutable container keeps a handler bug from mutating the payload
+# every client sees. Each example comes in two forms: "query_fast" selects
+# raw QIDs only, while "query_labeled" adds the label service, which WDQS
+# evaluates even when its output goes unused — prefer the fast variant and
+# resolve labels afterwards with the get_wikidata_labels tool.
+_SPARQL_EXAMPLES = {
+        "examples": (
             {
                 "name": "Basic entity information",
-                "query": """
+                "query_fast": """
+                SELECT ?property ?value
+                WHERE {
+                  wd:Q937 ?p ?value.  # Q937 = Albert Einstein
+                  ?property wikibase:directClaim ?p.
+                }
+                LIMIT 10
+                """,
+                "query_labeled": """
                 SELECT ?property ?propertyLabel ?value ?valueLabel
                 WHERE {
-                  wd:Q937 ?p ?statement.  # Q937 = Albert Einstein
-                  ?statement ?ps ?value.
-                  
-                  ?property wikibase:claim ?p.
-                  ?property wikibase:statementProperty ?ps.
-                  
+                  {
+                    SELECT ?property ?value
+                    WHERE {
+                      wd:Q937 ?p ?value.  # Q937 = Albert Einstein
+                      ?property wikibase:directClaim ?p.
+                    }
+                    LIMIT 10
+                  }
                   SERVICE wikibase:label { bd:serviceParam wikibase:language "en". }
                 }
-                LIMIT 10
                 """
             },
             {
                 "name": "Find all scientists",
-                "query": """
+                "query_fast": """
+                SELECT ?scientist
+                WHERE {
+                  ?scientist wdt:P106 wd:Q901.  # P106 = occupation, Q901 = scientist
+                }
+                LIMIT 20
+                """,
+                "query_labeled": """
                 SELECT ?scientist ?scientistLabel
                 WHERE {
                   ?scientist wdt:P106 wd:Q901.  # P106 = occupation, Q901 = scientist
@@ -353,7 +909,14 @@ def sparql_examples_resource():
             },
             {
                 "name": "Find books by an author",
-                "query": """
+                "query_fast": """
+                SELECT ?book
+                WHERE {
+                  ?book wdt:P50 wd:Q535.  # P50 = author, Q535 = Isaac Asimov
+                  ?book wdt:P31/wdt:P279* wd:Q571.  # P31 = instance of, P279 = subclass of, Q571 = book
+                }
+                """,
+                "query_labeled": """
                 SELECT ?book ?bookLabel
                 WHERE {
                   ?book wdt:P50 wd:Q535.  # P50 = author, Q535 = Isaac Asimov
@@ -364,7 +927,14 @@ def sparql_examples_resource():
             },
             {
                 "name": "Find capitals of countries",
-                "query": """
+                "query_fast": """
+                SELECT ?country ?capital
+                WHERE {
+                  ?country wdt:P31 wd:Q6256.  # P31 = instance of, Q6256 = country
+                  ?country wdt:P36 ?capital.  # P36 = capital
+                }
+                """,
+                "query_labeled": """
                 SELECT ?country ?countryLabel ?capital ?capitalLabel
                 WHERE {
                   ?country wdt:P31 wd:Q6256.  # P31 = instance of, Q6256 = country
@@ -375,7 +945,16 @@ def sparql_examples_resource():
             },
             {
                 "name": "Find mountains higher than 8000m",
-                "query": """
+                "query_fast": """
+                SELECT ?mountain ?height
+                WHERE {
+                  ?mountain wdt:P31/wdt:P279* wd:Q8502.  # P31 = instance of, P279 = subclass of, Q8502 = mountain
+                  ?mountain wdt:P2044 ?height.  # P2044 = elevation above sea level
+                  FILTER(?height > 8000)
+                }
+                ORDER BY DESC(?height)
+                """,
+                "query_labeled": """
                 SELECT ?mountain ?mountainLabel ?height
                 WHERE {
                   ?mountain wdt:P31/wdt:P279* wd:Q8502.  # P31 = instance of, P279 = subclass of, Q8502 = mountain
@@ -386,17 +965,36 @@ def sparql_examples_resource():
                 ORDER BY DESC(?height)
                 """
             }
-        ],
-        "description": "Example SPARQL queries for common Wikidata tasks. These can be used as templates for more specific queries."
+        ),
+        "description": "Example SPARQL queries for common Wikidata tasks. Prefer the query_fast variants: the label service slows queries down even when its output is unused, so select raw QIDs and resolve labels afterwards with the get_wikidata_labels tool if needed. The query_labeled variants keep the label service for one-shot convenience."
     }
 
+# Pre-serialized like _COMMON_PROPERTIES_JSON: the payload never changes
+_SPARQL_EXAMPLES_JSON = _dumps(_SPARQL_EXAMPLES)
+
+@mcp.resource("wikidata://sparql-examples")
+def sparql_examples_resource() -> str:
+    """
+    Provides example SPARQL queries for common Wikidata tasks.
+    """
+    return _SPARQL_EXAMPLES_JSON
+
 # ============= PROMPT TEMPLATES =============
 
+# The prompt texts are large multi-line strings; rendering one per fetch is
+# pure waste when clients poll the same prompts repeatedly, so each template
+# renders through an lru_cache'd helper keyed by its arguments and the
+# decorated functions just delegate.
+
 @mcp.prompt()
 def position_holders_template(position_name: str, limit: int = 3) -> list[base.Message]:
     """
     Template for finding people who held a specific position, ordered by recency.
     """
+    return _position_holders_messages(position_name, limit)
+
+@lru_cache(maxsize=128)
+def _position_holders_messages(position_name: str, limit: int) -> list[base.Message]:
     return [
         base.UserMessage(f"""
 You need to find the {limit} most recent holders of the position "{position_name}" in Wikidata.
@@ -426,6 +1024,10 @@ def entity_search_template(entity_name: str) -> list[base.Message]:
     """
     Template for searching a Wikidata entity.
     """
+    return _entity_search_messages(entity_name)
+
+@lru_cache(maxsize=128)
+def _entity_search_messages(entity_name: str) -> list[base.Message]:
     return [
         base.UserMessage(f"""
 You need to find accurate and up-to-date information about {entity_name} using Wikidata as your primary source of truth.
@@ -459,6 +1061,10 @@ def property_search_template(property_name: str) -> list[base.Message]:
     """
     Template for searching a Wikidata property.
     """
+    return _property_search_messages(property_name)
+
+@lru_cache(maxsize=128)
+def _property_search_messages(property_name: str) -> list[base.Message]:
     return [
         base.UserMessage(f"""
 You need to find accurate information about the Wikidata property "{property_name}" using only Wikidata's data.
@@ -495,6 +1101,10 @@ def entity_relation_template(entity1_name: str, entity2_name: str) -> list[base.
     """
     Template for finding relationships between entities.
     """
+    return _entity_relation_messages(entity1_name, entity2_name)
+
+@lru_cache(maxsize=128)
+def _entity_relation_messages(entity1_name: str, entity2_name: str) -> list[base.Message]:
     return [
         base.UserMessage(f"""
 You need to discover the factual relationships between {entity1_name} and {entity2_name} using Wikidata as your authoritative source.
@@ -510,30 +1120,32 @@ Follow these steps precisely:
 
 2. Once you have both entity IDs (e.g., Q12345 and Q67890), get their metadata using get_wikidata_metadata to confirm you have the correct entities.
 
-3. Execute a SPARQL query to find direct relationships between them:
+3. Execute a single SPARQL query that checks both directions at once with a VALUES clause (one round-trip instead of two):
    ```
-   SELECT ?relation ?relationLabel WHERE {{
-     wd:[ENTITY1_ID] ?p wd:[ENTITY2_ID].
+   SELECT ?a ?b ?relation ?relationLabel WHERE {{
+     VALUES (?a ?b) {{ (wd:[ENTITY1_ID] wd:[ENTITY2_ID]) (wd:[ENTITY2_ID] wd:[ENTITY1_ID]) }}
+     ?a ?p ?b.
      ?property wikibase:directClaim ?p.
      BIND(?property as ?relation)
      SERVICE wikibase:label {{ bd:serviceParam wikibase:language "en". }}
    }}
    ```
    - Replace [ENTITY1_ID] and [ENTITY2_ID] with the actual entity IDs.
-   - Also try the reverse direction by swapping the entity IDs.
+   - The ?a/?b bindings in each result row tell you which direction the relationship runs.
 
-4. If no direct relationship is found, look for indirect relationships:
+4. If no direct relationship is found, look for indirect relationships. Again use VALUES to cover both orientations in one query:
    ```
-   SELECT ?intermediateEntity ?intermediateEntityLabel ?relation1 ?relation1Label ?relation2 ?relation2Label WHERE {{
-     wd:[ENTITY1_ID] ?p1 ?intermediateEntity.
-     ?intermediateEntity ?p2 wd:[ENTITY2_ID].
-     
+   SELECT ?a ?b ?intermediateEntity ?intermediateEntityLabel ?relation1 ?relation1Label ?relation2 ?relation2Label WHERE {{
+     VALUES (?a ?b) {{ (wd:[ENTITY1_ID] wd:[ENTITY2_ID]) (wd:[ENTITY2_ID] wd:[ENTITY1_ID]) }}
+     ?a ?p1 ?intermediateEntity.
+     ?intermediateEntity ?p2 ?b.
+
      ?property1 wikibase:directClaim ?p1.
      ?property2 wikibase:directClaim ?p2.
-     
+
      BIND(?property1 as ?relation1)
      BIND(?property2 as ?relation2)
-     
+
      SERVICE wikibase:label {{ bd:serviceParam wikibase:language "en". }}
    }}
    LIMIT 5
@@ -552,7 +1164,10 @@ def general_wikidata_guidance() -> list[base.Message]:
     """
     General guidance for interacting with Wikidata through MCP.
     """
-    return [
+    return _GUIDANCE_MSGS
+
+# Takes no arguments, so the message list is simply built once
+_GUIDANCE_MSGS = [
         base.UserMessage("""
 When using Wikidata as a knowledge source, follow these important guidelines:
 
@@ -632,10 +1247,21 @@ By following these guidelines, you'll provide more accurate, up-to-date, and ver
 # ============= CREATE SSE APP =============
 
 # Configure SSE transport with trailing slash to match client expectations
-sse_transport = SseServerTransport("/messages/")  
-
-# Create FastAPI app with explicit CORS configuration
-app = FastAPI()
+sse_transport = SseServerTransport("/messages/")
+
+# The initialization options only reflect the tool/prompt/resource
+# registrations above, which are fixed by the time this module finishes
+# importing, so build them once instead of per SSE connection
+_INIT_OPTIONS = mcp._mcp_server.create_initialization_options()
+
+# Create FastAPI app with explicit CORS configuration. JSON endpoints
+# (/, /health and anything returning dicts) render through orjson when
+# it's available, matching the _dumps fallback above.
+if _HAS_ORJSON:
+    from fastapi.responses import ORJSONResponse
+    app = FastAPI(default_response_class=ORJSONResponse)
+else:
+    app = FastAPI()
 
 # Add CORS middleware with explicit CORS configuration
 app.add_middleware(
@@ -646,25 +1272,101 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Almacenar sesiones activas
-active_sessions = {}
+# Almacenar sesiones activas. Timestamps are monotonic integers
+# (time.monotonic_ns) rather than ISO strings: cheaper to record, immune to
+# clock adjustments, and the OrderedDict keeps recency order via move_to_end
+# so "most recent session" is O(1) instead of a sort.
+@dataclass(slots=True)
+class Session:
+    """Per-connection bookkeeping; slotted to keep many sessions cheap."""
+    client_host: str
+    created_ns: int
+    last_activity_ns: int
+    connection_count: int = 0
+    message_count: int = 0
+
+active_sessions: OrderedDict[str, Session] = OrderedDict()
+
+def _client_host(request: Request) -> str:
+    """Return the peer address, or 'unknown' when the scope carries none."""
+    client = getattr(request, "client", None)
+    return client.host if client else "unknown"
+
+# Readiness signal per session: set once the SSE stream is established, so
+# POST handlers wait exactly as long as needed instead of a fixed sleep.
+_sse_ready: dict[str, asyncio.Event] = {}
+
+# sse_endpoint deletes its session in a finally clause, but crashes and the
+# POST path that auto-creates sessions can still leak entries, so a
+# background sweeper bounds the table: idle sessions are evicted after
+# _SESSION_IDLE_TTL_NS and the oldest are dropped beyond _MAX_SESSIONS.
+_SESSION_IDLE_TTL_NS = 30 * 60 * 1_000_000_000  # 30 minutes
+_MAX_SESSIONS = 1000
+_SWEEP_INTERVAL_S = 30
+
+async def _sweep_sessions():
+    while True:
+        await asyncio.sleep(_SWEEP_INTERVAL_S)
+        cutoff = time.monotonic_ns() - _SESSION_IDLE_TTL_NS
+        evicted = 0
+        for sid, session in list(active_sessions.items()):
+            if session.last_activity_ns < cutoff:
+                del active_sessions[sid]
+                evicted += 1
+        # The OrderedDict is in recency order, so trimming from the front
+        # drops the least recently active sessions first
+        while len(active_sessions) > _MAX_SESSIONS:
+            active_sessions.popitem(last=False)
+            evicted += 1
+        if evicted:
+            logger.info("Swept %d stale sessions, %d active", evicted, len(active_sessions))
+
+# Strong references to background tasks: the event loop only keeps weak
+# refs, so an unstored create_task result can be garbage-collected mid-flight
+_background_tasks: set = set()
+
+def _spawn_background(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+@app.on_event("startup")
+async def _warm_caches():
+    # Allow more blocking tool calls in flight than anyio's default of 40
+    anyio.to_thread.current_default_thread_limiter().total_tokens = 64
+    # Run in the background so startup (and the health check) isn't blocked
+    _spawn_background(_prewarm())
+    _spawn_background(_sweep_sessions())
+
+@app.on_event("shutdown")
+async def _persist_top_entities():
+    _save_top_entities()
+
+# Define root endpoint. The payload is static, so serialize it once and
+# skip the response-model machinery on every probe.
+_ROOT_BODY = _dumps(
+    {"message": "Wikidata MCP Server is running. Use /sse for MCP connections."}
+).encode()
 
-# Define root endpoint
 @app.get("/")
 def root():
-    return {"message": "Wikidata MCP Server is running. Use /sse for MCP connections."}
+    return Response(_ROOT_BODY, media_type="application/json")
 
-# Health check endpoint for Render
+# Health check endpoint for Render. Platform probes hit this constantly,
+# so only the connection count is formatted per call.
 @app.get("/health")
 def health():
-    return {"status": "healthy", "connections": len(active_sessions)}
+    return Response(
+        b'{"status": "healthy", "connections": %d}' % len(active_sessions),
+        media_type="application/json"
+    )
 
 # Define SSE endpoint
 @app.get("/sse")
 async def sse_endpoint(request: Request):
     """SSE endpoint for MCP connections"""
-    client_host = request.client.host if hasattr(request, 'client') and request.client else 'unknown'
-    print(f"SSE connection request received from: {client_host}")
+    client_host = _client_host(request)
+    logger.info("SSE connection request received from: %s", client_host)
     
     # Check if there's a session ID in the query parameters
     existing_session_id = request.query_params.get("session_id")
@@ -672,23 +1374,27 @@ async def sse_endpoint(request: Request):
     # If a valid session ID was provided and exists, use it
     if existing_session_id and existing_session_id in active_sessions:
         session_id = existing_session_id
-        print(f"Using existing session ID: {session_id}")
+        logger.debug("Using existing session ID: %s", session_id)
         # Update the last activity timestamp
-        active_sessions[session_id]["last_activity"] = datetime.now().isoformat()
+        active_sessions[session_id].last_activity_ns = time.monotonic_ns()
+        active_sessions.move_to_end(session_id)
     else:
         # Generate a new session ID for this connection
         session_id = str(uuid4())
-        print(f"Generated new session ID: {session_id}")
-        
+        logger.info("Generated new session ID: %s", session_id)
+
         # Store the session with more metadata
-        active_sessions[session_id] = {
-            "client_host": client_host,
-            "created_at": datetime.now().isoformat(),
-            "last_activity": datetime.now().isoformat(),
-            "connection_count": 1
-        }
-    print(f"Active sessions: {len(active_sessions)}")
-    
+        now_ns = time.monotonic_ns()
+        active_sessions[session_id] = Session(
+            client_host=client_host,
+            created_ns=now_ns,
+            last_activity_ns=now_ns,
+            connection_count=1
+        )
+    logger.debug("Active sessions: %d", len(active_sessions))
+
+    ready = _sse_ready.setdefault(session_id, asyncio.Event())
+
     # Use the standard SseServerTransport approach
     async with sse_transport.connect_sse(
         request.scope,
@@ -697,34 +1403,32 @@ async def sse_endpoint(request: Request):
     ) as (read_stream, write_stream):
         # Create timeout options with extended timeout
         timeout_options = {"timeoutMs": 600000}  # 10 minutes
-        
-        print(f"Starting MCP server with session ID: {session_id}")
+
+        # The streams exist once connect_sse enters its body, so waiting
+        # POST handlers can proceed now — no fixed delay needed
+        ready.set()
+
+        logger.info("Starting MCP server with session ID: %s", session_id)
         try:
-            # Add a small delay to ensure connection is fully established
-            await asyncio.sleep(0.5)
-            
-            # Use default initialization options without any modifications
-            init_options = mcp._mcp_server.create_initialization_options()
-            
-            # Run MCP server with default initialization options
+            # Run MCP server with the precomputed initialization options
             await mcp._mcp_server.run(
                 read_stream,
                 write_stream,
-                init_options
+                _INIT_OPTIONS
             )
         except RuntimeError as re:
             error_msg = str(re)
-            print(f"RuntimeError in MCP server: {error_msg}")
+            logger.error("RuntimeError in MCP server: %s", error_msg)
             # Provide more detailed error message for initialization issues
             if "initialization was complete" in error_msg:
-                print(f"Initialization error for session {session_id}. Client may have sent requests too early.")
+                logger.error("Initialization error for session %s. Client may have sent requests too early.", session_id)
             # Eliminar la sesión si hay un error
             if session_id in active_sessions:
                 del active_sessions[session_id]
             # Don't re-raise the exception to prevent 500 errors
             return Response(status_code=503, content="Service temporarily unavailable. Please try again.")
         except Exception as e:
-            print(f"Error in MCP server: {e}")
+            logger.error("Error in MCP server: %s", e)
             # Eliminar la sesión si hay un error
             if session_id in active_sessions:
                 del active_sessions[session_id]
@@ -734,102 +1438,178 @@ async def sse_endpoint(request: Request):
             # Eliminar la sesión cuando se cierra la conexión
             if session_id in active_sessions:
                 del active_sessions[session_id]
-            print(f"SSE connection closed for session {session_id}")
+            _sse_ready.pop(session_id, None)
+            logger.info("SSE connection closed for session %s", session_id)
+
+# ETag support for the HTTP SPARQL routes: the tag is derived from the
+# canonicalized query, so formatting differences still match, and a client
+# (or fronting cache like Varnish/Cloudflare) sending If-None-Match gets a
+# zero-work 304 instead of re-running the query
+@app.middleware("http")
+async def sparql_etag_middleware(request: Request, call_next):
+    query = None
+    if request.url.path.startswith("/tools/sparql"):
+        query = request.query_params.get("query")
+    if not query:
+        return await call_next(request)
+
+    etag = '"' + _sparql_cache_key(query) + '"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers["ETag"] = etag
+        # Don't clobber a Cache-Control the endpoint set itself (the stream
+        # route deliberately sends no-cache so proxies don't buffer the SSE)
+        if "cache-control" not in response.headers:
+            response.headers["Cache-Control"] = "public, max-age=3600"
+    return response
+
+# Streaming SPARQL endpoint: emits one SSE event per result binding so large
+# results never have to be buffered in full and the first row arrives as soon
+# as the endpoint produces it
+@app.get("/tools/sparql/stream")
+async def sparql_stream(request: Request):
+    """Stream SPARQL result bindings as server-sent events."""
+    query = request.query_params.get("query")
+    if not query:
+        return Response(status_code=400, content="Missing 'query' parameter")
+
+    validation = _validate_sparql_query(query)
+    if "error" in validation:
+        return Response(status_code=400, content=_dumps(validation), media_type="application/json")
+
+    async def event_generator():
+        try:
+            async for binding in execute_sparql_stream(query):
+                yield {"data": _dumps(binding)}
+            yield {"event": "done", "data": ""}
+        except Exception as e:
+            yield {"event": "error", "data": _dumps({"error": f"Error executing query: {str(e)}"})}
+
+    return EventSourceResponse(
+        event_generator(),
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # Añadir un endpoint OPTIONS explícito para /messages y /messages/
+# Preflights arrive on every cross-origin POST, so the header dict is
+# built once instead of per request
+_PREFLIGHT_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+    "Access-Control-Allow-Headers": "*",
+    "Access-Control-Allow-Credentials": "true",
+}
+
 @app.options("/messages")
 @app.options("/messages/")
 async def options_messages():
-    return Response(
-        status_code=200,
-        headers={
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
-            "Access-Control-Allow-Headers": "*",
-            "Access-Control-Allow-Credentials": "true",
-        }
-    )
+    return Response(status_code=200, headers=_PREFLIGHT_HEADERS)
 
 # Añadir un endpoint POST explícito para /messages (sin barra final)
 @app.post("/messages")
 async def post_messages_no_slash(request: Request):
     """Handle POST requests to /messages endpoint (no trailing slash)"""
-    client_host = request.client.host if hasattr(request, 'client') and request.client else 'unknown'
-    print(f"POST request to /messages received from: {client_host}")
+    client_host = _client_host(request)
+    logger.debug("POST request to /messages received from: %s", client_host)
     
     try:
         # Extract the session_id from query parameters
         session_id = request.query_params.get("session_id")
-        print(f"Session ID from query params: {session_id}")
+        logger.debug("Session ID from query params: %s", session_id)
         
         # Verify if the session is active
         if not session_id or session_id not in active_sessions:
-            print(f"Session ID {session_id} not found in active sessions")
+            logger.info("Session ID %s not found in active sessions", session_id)
             # If we have any active sessions, use the most recently active one
             if active_sessions:
-                # Sort sessions by last_activity if available
-                sorted_sessions = sorted(
-                    active_sessions.items(),
-                    key=lambda x: x[1].get("last_activity", x[1].get("created_at", "")),
-                    reverse=True
-                )
-                session_id = sorted_sessions[0][0]
-                print(f"Using most recent active session: {session_id}")
+                # The OrderedDict is kept in recency order, so the most
+                # recently active session is simply the last key
+                session_id = next(reversed(active_sessions))
+                logger.info("Using most recent active session: %s", session_id)
                 # Update session metadata
-                active_sessions[session_id]["last_activity"] = datetime.now().isoformat()
-                active_sessions[session_id]["message_count"] = active_sessions[session_id].get("message_count", 0) + 1
+                session = active_sessions[session_id]
+                session.last_activity_ns = time.monotonic_ns()
+                session.message_count += 1
             else:
                 # If no active sessions exist, create a new one
                 session_id = str(uuid4())
-                print(f"No active sessions found, generated new session ID: {session_id}")
-                active_sessions[session_id] = {
-                    "client_host": client_host,
-                    "created_at": datetime.now().isoformat(),
-                    "last_activity": datetime.now().isoformat(),
-                    "message_count": 1,
-                    "connection_count": 0  # Will be incremented when SSE connection is established
-                }
+                logger.info("No active sessions found, generated new session ID: %s", session_id)
+                now_ns = time.monotonic_ns()
+                active_sessions[session_id] = Session(
+                    client_host=client_host,
+                    created_ns=now_ns,
+                    last_activity_ns=now_ns,
+                    message_count=1,
+                    connection_count=0  # Will be incremented when SSE connection is established
+                )
         else:
             # Update session metadata for existing session
-            active_sessions[session_id]["last_activity"] = datetime.now().isoformat()
-            active_sessions[session_id]["message_count"] = active_sessions[session_id].get("message_count", 0) + 1
+            session = active_sessions[session_id]
+            session.last_activity_ns = time.monotonic_ns()
+            session.message_count += 1
+            active_sessions.move_to_end(session_id)
         
-        # Add session_id to query params if not present
-        if "session_id" not in request.query_params:
-            # Create a new request with the session_id added
-            # This is a bit hacky but necessary since FastAPI request objects are immutable
-            request.scope["query_string"] = f"session_id={session_id}".encode()
+        # Add session_id to the query string if not present. Work on the raw
+        # bytes: appending to the existing value preserves the other
+        # parameters (the old code dropped them) and skips a str round-trip.
+        qs = request.scope.get("query_string", b"")
+        if b"session_id=" not in qs:
+            request.scope["query_string"] = (
+                qs + (b"&" if qs else b"") + b"session_id=" + session_id.encode("ascii")
+            )
         
-        # Print request body for debugging (limited to first 200 chars)
-        body = await request.body()
-        body_str = body.decode('utf-8')[:200]
-        print(f"Request body (truncated): {body_str}...")
+        # Reading the body buffers a full copy just for a debug line, so
+        # only pay for it when body logging is explicitly enabled
+        if _DEBUG_BODY:
+            body = await request.body()
+            logger.debug("Request body (truncated): %s...", body[:200].decode("utf-8", "replace"))
         
         # Use the SseServerTransport's handle_post_message method
         try:
-            # Add a small delay to ensure the SSE connection is ready
-            await asyncio.sleep(0.5)
-            
+            # Wait for the SSE stream to signal readiness rather than
+            # sleeping a fixed interval; in the common case the event is
+            # already set and this costs nothing
+            ready = _sse_ready.get(session_id)
+            if ready is not None and not ready.is_set():
+                try:
+                    await asyncio.wait_for(ready.wait(), timeout=2.0)
+                except asyncio.TimeoutError:
+                    pass
+
+            # Cheap liveness predicate: without a live SSE stream the
+            # transport call below can only end in BrokenResourceError, so
+            # reject up front instead of paying for the raise
+            if ready is None or not ready.is_set():
+                logger.warning("No live SSE stream for session %s - rejecting POST", session_id)
+                return Response(
+                    status_code=409,
+                    content="SSE connection not established for this session. Connect to /sse first.",
+                    media_type="text/plain"
+                )
+
             # Handle the message with error catching
             response = await sse_transport.handle_post_message(request)
             return response
         except anyio.BrokenResourceError:
             # This is a common error when the client disconnects or the stream is broken
-            print(f"BrokenResourceError for session {session_id} - client may have disconnected")
+            logger.warning("BrokenResourceError for session %s - client may have disconnected", session_id)
             return Response(
                 status_code=202,  # Accepted but not processed
                 content="Message received but connection was broken. Please reconnect SSE.",
                 media_type="text/plain"
             )
         except Exception as e:
-            print(f"Error in handle_post_message: {e}")
+            logger.error("Error in handle_post_message: %s", e)
             return Response(
                 status_code=500,
                 content=f"Error processing request: {str(e)}",
                 media_type="text/plain"
             )
     except Exception as e:
-        print(f"Error handling POST request: {e}")
+        logger.error("Error handling POST request: %s", e)
         return Response(
             status_code=500,
             content=f"Error processing request: {str(e)}",
@@ -842,17 +1622,20 @@ app.mount("/messages/", app=sse_transport.handle_post_message)
 # ============= SERVER EXECUTION =============
 
 if __name__ == "__main__":
-    print("Starting Wikidata MCP Server with SSE transport...")
+    logging.basicConfig(level=logging.INFO)
+    logger.info("Starting Wikidata MCP Server with SSE transport...")
     port = int(os.environ.get("PORT", 8000))
     
     # Configure uvicorn with optimized settings for Railway
     uvicorn.run(
-        app, 
-        host="0.0.0.0", 
+        app,
+        host="0.0.0.0",
         port=port,
+        loop="uvloop",           # libuv-based loop, much faster for SSE workloads
+        http="httptools",        # C HTTP parser instead of pure-Python h11
         timeout_keep_alive=300,  # Increase keep-alive timeout to 5 minutes
         log_level="info",
         proxy_headers=True,      # Enable proxy headers
         forwarded_allow_ips="*", # Allow all forwarded IPs
-        workers=1                # Use a single worker for SSE
+        workers=1                # Use a single worker for SSE (session state is in-process)
     )
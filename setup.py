@@ -0,0 +1,27 @@
+"""
+Optional Cython build for the server modules.
+
+The server runs fine as plain Python; compiling server_sse.py and
+wikidata_api.py to extension modules shaves interpreter dispatch overhead
+off the prompt/resource/session glue. Build with:
+
+    pip install cython && python setup.py build_ext --inplace
+
+The .py sources stay importable, so skipping this step changes nothing.
+"""
+from setuptools import setup
+
+try:
+    from Cython.Build import cythonize
+except ImportError:
+    ext_modules = []
+else:
+    ext_modules = cythonize(
+        ["server_sse.py", "wikidata_api.py"],
+        language_level=3,
+    )
+
+setup(
+    name="wikidata-mcp",
+    ext_modules=ext_modules,
+)
@@ -3,18 +3,98 @@ Wikidata API Module
 
 This module provides functions for interacting with the Wikidata API and SPARQL endpoint.
 """
+import re
 import json
+import asyncio
+import httpx
+import ijson
+import logging
 import requests
-import traceback
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-# Import SPARQLWrapper
-from SPARQLWrapper import SPARQLWrapper, JSON
+logger = logging.getLogger(__name__)
+
+# orjson decodes/encodes the large SPARQL payloads several times faster than
+# the stdlib; fall back to stdlib json when unavailable.
+try:
+    import orjson
+
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj) -> str:
+        return json.dumps(obj)
+
+    _loads = json.loads
 
 # Constants
 WIKIDATA_API_URL = "https://www.wikidata.org/w/api.php"
 WIKIDATA_SPARQL_ENDPOINT = "https://query.wikidata.org/sparql"
 USER_AGENT = "Wikidata MCP Server/1.0 (https://github.com/ebaenamar/wikidata-mcp; ebaenamar@gmail.com)"
 
+# Valid entity/property identifiers: Q or P followed by digits. Checking
+# before the network call turns obviously bad input (empty strings, labels
+# passed as ids) into an immediate error instead of a wasted round-trip,
+# and the upper-cased form keeps "q937" and "Q937" equivalent.
+_ENTITY_ID_RE = re.compile(r"^[QP]\d+$")
+
+def _normalize_entity_id(entity_id: str) -> str:
+    """Return the canonical form of an entity ID, or '' when invalid."""
+    entity_id = entity_id.strip().upper()
+    return entity_id if _ENTITY_ID_RE.match(entity_id) else ""
+
+# Common prefixes prepended to queries that don't declare their own
+SPARQL_PREFIXES = """
+PREFIX wd: <http://www.wikidata.org/entity/>
+PREFIX wdt: <http://www.wikidata.org/prop/direct/>
+PREFIX p: <http://www.wikidata.org/prop/>
+PREFIX ps: <http://www.wikidata.org/prop/statement/>
+PREFIX wikibase: <http://wikiba.se/ontology#>
+PREFIX bd: <http://www.bigdata.com/rdf#>
+"""
+
+@lru_cache(maxsize=2048)
+def _prepend_prefixes(sparql_query: str) -> str:
+    """
+    Add the common prefixes unless the query declares its own.
+
+    Deterministic in its input, so repeat executions of the same query
+    (templated lookups, TTL-expired cache refreshes) skip the scan and
+    concatenation entirely.
+    """
+    if "PREFIX" not in sparql_query and "prefix" not in sparql_query:
+        return SPARQL_PREFIXES + sparql_query
+    return sparql_query
+
+# Shared session so every call reuses pooled keep-alive connections instead
+# of opening a fresh TLS connection; transient 5xx/429 responses are retried
+# with backoff at the transport level.
+_SESSION = requests.Session()
+# SPARQL JSON is highly repetitive, so compressed transfer cuts on-the-wire
+# bytes dramatically; brotli slightly outperforms gzip and both decompress
+# transparently in the client.
+_SESSION.headers.update({
+    "User-Agent": USER_AGENT,
+    "Accept-Encoding": "br, gzip",
+})
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=50,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.3,
+        # Jitter desynchronizes retry bursts, and honoring Retry-After
+        # matters on Wikidata's rate-limited endpoints
+        backoff_jitter=0.5,
+        respect_retry_after_header=True,
+        status_forcelist=(429, 500, 502, 503, 504),
+    ),
+))
+
 def search_entity(query: str) -> str:
     """
     Search for a Wikidata entity ID by its name.
@@ -33,14 +113,10 @@ def search_entity(query: str) -> str:
         "type": "item"
     }
     
-    headers = {
-        "User-Agent": USER_AGENT
-    }
-    
     try:
-        response = requests.get(WIKIDATA_API_URL, params=params, headers=headers)
+        response = _SESSION.get(WIKIDATA_API_URL, params=params)
         response.raise_for_status()
-        data = response.json()
+        data = _loads(response.content)
         
         if "search" in data and len(data["search"]) > 0:
             return data["search"][0]["id"]
@@ -67,14 +143,10 @@ def search_property(query: str) -> str:
         "type": "property"
     }
     
-    headers = {
-        "User-Agent": USER_AGENT
-    }
-    
     try:
-        response = requests.get(WIKIDATA_API_URL, params=params, headers=headers)
+        response = _SESSION.get(WIKIDATA_API_URL, params=params)
         response.raise_for_status()
-        data = response.json()
+        data = _loads(response.content)
         
         if "search" in data and len(data["search"]) > 0:
             return data["search"][0]["id"]
@@ -93,6 +165,10 @@ def get_entity_metadata(entity_id: str) -> dict:
     Returns:
         A dictionary containing the entity's label and description
     """
+    entity_id = _normalize_entity_id(entity_id)
+    if not entity_id:
+        return {"error": "Invalid entity ID: expected Q or P followed by digits"}
+
     params = {
         "action": "wbgetentities",
         "format": "json",
@@ -101,14 +177,10 @@ def get_entity_metadata(entity_id: str) -> dict:
         "props": "labels|descriptions"
     }
     
-    headers = {
-        "User-Agent": USER_AGENT
-    }
-    
     try:
-        response = requests.get(WIKIDATA_API_URL, params=params, headers=headers)
+        response = _SESSION.get(WIKIDATA_API_URL, params=params)
         response.raise_for_status()
-        data = response.json()
+        data = _loads(response.content)
         
         if "entities" in data and entity_id in data["entities"]:
             entity = data["entities"][entity_id]
@@ -125,31 +197,74 @@ def get_entity_metadata(entity_id: str) -> dict:
     except requests.exceptions.RequestException as e:
         return {"error": f"Error retrieving entity metadata: {str(e)}"}
 
-def get_entity_properties(entity_id: str) -> list:
+def execute_sparql_iter(sparql_query: str):
+    """
+    Execute a SPARQL query and yield result bindings one at a time.
+
+    The HTTP response is parsed incrementally, so the full SPARQL JSON
+    envelope is never materialized in memory.
+
+    Args:
+        sparql_query: SPARQL query to execute
+
+    Yields:
+        One binding dictionary per result row
+    """
+    full_query = _prepend_prefixes(sparql_query)
+
+    with _SESSION.post(
+        WIKIDATA_SPARQL_ENDPOINT,
+        data={"query": full_query},
+        headers={"Accept": "application/sparql-results+json"},
+        stream=True,
+        timeout=60,
+    ) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        yield from ijson.items(response.raw, "results.bindings.item")
+
+def get_entity_properties(entity_id: str, limit: int = 50) -> dict:
     """
     Get all properties for a Wikidata entity.
-    
+
+    Truthy wdt: triples are queried directly (one join via
+    wikibase:directClaim) instead of walking statement reification, which
+    the endpoint planner handles orders of magnitude faster.
+
     Args:
         entity_id: The Wikidata entity ID (e.g., Q937)
-        
+        limit: Maximum number of property-value rows to return
+
     Returns:
-        A list of property-value pairs for the entity
+        A dictionary with a "bindings" list of property-value pairs for the entity
     """
+    entity_id = _normalize_entity_id(entity_id)
+    if not entity_id:
+        return {"error": "Invalid entity ID: expected Q or P followed by digits"}
+
     sparql_query = f"""
     SELECT ?property ?propertyLabel ?value ?valueLabel
     WHERE {{
-      wd:{entity_id} ?p ?statement.
-      ?statement ?ps ?value.
-      
-      ?property wikibase:claim ?p.
-      ?property wikibase:statementProperty ?ps.
-      
+      wd:{entity_id} ?directProp ?value.
+      ?property wikibase:directClaim ?directProp.
+
       SERVICE wikibase:label {{ bd:serviceParam wikibase:language "en". }}
     }}
-    LIMIT 50
+    LIMIT {limit}
     """
-    
-    return json.loads(execute_sparql(sparql_query))
+
+    try:
+        return {"bindings": list(execute_sparql_iter(sparql_query))}
+    except Exception as e:
+        error_details = {
+            "error": f"Error executing query: {str(e)}",
+            "query": sparql_query,
+            "error_type": str(type(e).__name__)
+        }
+        # logger.exception captures the traceback lazily, so nothing is
+        # formatted unless a handler actually emits the record
+        logger.exception("SPARQL query failed: %s", e)
+        return error_details
 
 def execute_sparql(sparql_query: str) -> str:
     """
@@ -162,39 +277,274 @@ def execute_sparql(sparql_query: str) -> str:
         JSON-formatted result of the query
     """
     try:
-        sparql = SPARQLWrapper(WIKIDATA_SPARQL_ENDPOINT)
-        sparql.addCustomHttpHeader("User-Agent", USER_AGENT)
-        
-        # Add common prefixes to make queries easier to write
-        prefixes = """
-        PREFIX wd: <http://www.wikidata.org/entity/>
-        PREFIX wdt: <http://www.wikidata.org/prop/direct/>
-        PREFIX p: <http://www.wikidata.org/prop/>
-        PREFIX ps: <http://www.wikidata.org/prop/statement/>
-        PREFIX wikibase: <http://wikiba.se/ontology#>
-        PREFIX bd: <http://www.bigdata.com/rdf#>
-        """
-        
-        # Add prefixes if they're not already in the query
-        if not any(prefix in sparql_query for prefix in ["PREFIX", "prefix"]):
-            full_query = prefixes + sparql_query
-        else:
-            full_query = sparql_query
-        
-        sparql.setQuery(full_query)
-        sparql.setReturnFormat(JSON)
-        
-        results = sparql.query().convert()
+        full_query = _prepend_prefixes(sparql_query)
+
+        # POST avoids URL-length limits on large queries
+        response = _SESSION.post(
+            WIKIDATA_SPARQL_ENDPOINT,
+            data={"query": full_query},
+            headers={"Accept": "application/sparql-results+json"},
+            timeout=60,
+        )
+        response.raise_for_status()
         # Return the full results structure, not just the bindings
-        return json.dumps(results)
+        return response.text
     except Exception as e:
         error_details = {
             "error": f"Error executing query: {str(e)}",
             "query": sparql_query,
-            "error_type": str(type(e).__name__),
-            "traceback": traceback.format_exc()
+            "error_type": str(type(e).__name__)
         }
-        print(f"SPARQL Error Details: {json.dumps(error_details, indent=2)}")
-        return json.dumps(error_details)
+        # logger.exception captures the traceback lazily, so nothing is
+        # formatted unless a handler actually emits the record
+        logger.exception("SPARQL query failed: %s", e)
+        return _dumps(error_details)
+
+# ============= ASYNC VARIANTS =============
+
+# Shared pooled HTTP client so concurrent tool calls reuse keep-alive
+# connections instead of paying a TCP/TLS handshake per request.
+_async_client = None
+
+def get_async_client() -> httpx.AsyncClient:
+    """Return the shared pooled async HTTP client, creating it on first use."""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=50, max_connections=100),
+            timeout=30.0,
+            headers={"User-Agent": USER_AGENT, "Accept-Encoding": "br, gzip"},
+        )
+    return _async_client
+
+async def _search_async(query: str, entity_type: str, kind: str, not_found_message: str) -> str:
+    params = {
+        "action": "wbsearchentities",
+        "format": "json",
+        "language": "en",
+        "search": query,
+        "type": entity_type
+    }
+
+    try:
+        response = await get_async_client().get(WIKIDATA_API_URL, params=params)
+        response.raise_for_status()
+        data = _loads(response.content)
+
+        if "search" in data and len(data["search"]) > 0:
+            return data["search"][0]["id"]
+        else:
+            return not_found_message
+    except httpx.HTTPError as e:
+        return f"Error searching for {kind}: {str(e)}"
+
+async def search_entity_async(query: str) -> str:
+    """
+    Async variant of search_entity, sharing the pooled HTTP client.
+
+    Args:
+        query: The search term
+
+    Returns:
+        The Wikidata entity ID (e.g., Q937 for Albert Einstein) or an error message
+    """
+    return await _search_async(query, "item", "entity", "No entity found")
+
+async def search_property_async(query: str) -> str:
+    """
+    Async variant of search_property, sharing the pooled HTTP client.
+
+    Args:
+        query: The search term
+
+    Returns:
+        The Wikidata property ID (e.g., P31 for "instance of") or an error message
+    """
+    return await _search_async(query, "property", "property", "No property found")
+
+async def search_entities(queries: list[str]) -> list[str]:
+    """
+    Search several entity names concurrently over the pooled client.
+
+    Args:
+        queries: The search terms
+
+    Returns:
+        One entity ID (or error/not-found message) per query, in input order
+    """
+    return list(await asyncio.gather(*(search_entity_async(q) for q in queries)))
+
+# wbgetentities accepts up to 50 pipe-separated ids per call
+_WBGETENTITIES_BATCH = 50
+
+async def _get_metadata_chunk(ids: tuple[str, ...]) -> dict:
+    """Fetch label/description for up to 50 ids in one wbgetentities call."""
+    params = {
+        "action": "wbgetentities",
+        "format": "json",
+        "ids": "|".join(ids),
+        "languages": "en",
+        "props": "labels|descriptions"
+    }
+
+    try:
+        response = await get_async_client().get(WIKIDATA_API_URL, params=params)
+        response.raise_for_status()
+        data = _loads(response.content)
+    except httpx.HTTPError as e:
+        error = {"error": f"Error retrieving entity metadata: {str(e)}"}
+        return {entity_id: dict(error) for entity_id in ids}
+
+    entities = data.get("entities", {})
+    results = {}
+    for entity_id in ids:
+        entity = entities.get(entity_id)
+        if entity is None or "missing" in entity:
+            results[entity_id] = {"error": f"Entity {entity_id} not found"}
+            continue
+        label = entity.get("labels", {}).get("en", {}).get("value", "No label found")
+        description = entity.get("descriptions", {}).get("en", {}).get("value", "No description found")
+        results[entity_id] = {
+            "id": entity_id,
+            "label": label,
+            "description": description
+        }
+    return results
+
+async def get_entities_metadata(entity_ids: list[str]) -> dict:
+    """
+    Get labels and descriptions for several entities in as few HTTP calls
+    as possible: ids are grouped 50 to a request (the wbgetentities limit)
+    and the chunks run concurrently.
+
+    Args:
+        entity_ids: The Wikidata entity IDs (e.g., ["Q937", "Q42"])
+
+    Returns:
+        A dictionary mapping each id (as given) to its metadata dict
+        (or an error dict)
+    """
+    results = {}
+    valid = []  # (id as given, normalized id)
+    for entity_id in entity_ids:
+        normalized = _normalize_entity_id(entity_id)
+        if normalized:
+            valid.append((entity_id, normalized))
+        else:
+            results[entity_id] = {"error": "Invalid entity ID: expected Q or P followed by digits"}
+
+    chunks = [
+        tuple(normalized for _, normalized in valid[i:i + _WBGETENTITIES_BATCH])
+        for i in range(0, len(valid), _WBGETENTITIES_BATCH)
+    ]
+    fetched = {}
+    for chunk_result in await asyncio.gather(*(_get_metadata_chunk(c) for c in chunks)):
+        fetched.update(chunk_result)
+    for entity_id, normalized in valid:
+        results[entity_id] = fetched[normalized]
+    return results
+
+async def get_entity_metadata_async(entity_id: str) -> dict:
+    """
+    Async variant of get_entity_metadata, sharing the pooled HTTP client.
+    Thin wrapper over the batched wbgetentities primitive.
+
+    Args:
+        entity_id: The Wikidata entity ID (e.g., Q937)
+
+    Returns:
+        A dictionary containing the entity's label and description
+    """
+    results = await get_entities_metadata([entity_id])
+    return results[entity_id]
+
+async def execute_sparql_raw_async(sparql_query: str) -> dict:
+    """
+    Async variant of execute_sparql that returns the parsed result structure
+    directly, so composite tools can embed it without a JSON round-trip.
+
+    Args:
+        sparql_query: SPARQL query to execute
+
+    Returns:
+        The result of the query as a dictionary (an error dictionary on failure)
+    """
+    full_query = _prepend_prefixes(sparql_query)
+
+    try:
+        response = await get_async_client().post(
+            WIKIDATA_SPARQL_ENDPOINT,
+            data={"query": full_query},
+            headers={"Accept": "application/sparql-results+json"},
+        )
+        response.raise_for_status()
+        return _loads(response.content)
+    except Exception as e:
+        error_details = {
+            "error": f"Error executing query: {str(e)}",
+            "query": sparql_query,
+            "error_type": str(type(e).__name__)
+        }
+        # logger.exception captures the traceback lazily, so nothing is
+        # formatted unless a handler actually emits the record
+        logger.exception("SPARQL query failed: %s", e)
+        return error_details
+
+async def execute_sparql_async(sparql_query: str) -> str:
+    """
+    Async variant of execute_sparql, posting directly to the SPARQL endpoint
+    over the pooled HTTP client.
+
+    Args:
+        sparql_query: SPARQL query to execute
+
+    Returns:
+        JSON-formatted result of the query
+    """
+    return _dumps(await execute_sparql_raw_async(sparql_query))
+
+class _AsyncByteReader:
+    """Adapts an httpx byte iterator to the async file API ijson expects."""
+
+    def __init__(self, byte_iterator):
+        self._iterator = byte_iterator
+        self._buffer = b""
+
+    async def read(self, size: int) -> bytes:
+        while len(self._buffer) < size:
+            try:
+                self._buffer += await self._iterator.__anext__()
+            except StopAsyncIteration:
+                break
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+async def execute_sparql_stream(sparql_query: str):
+    """
+    Execute a SPARQL query and yield result bindings one at a time.
+
+    The HTTP response is parsed incrementally, so memory use stays constant
+    no matter how large the result set is, and the first binding is available
+    as soon as the endpoint produces it.
+
+    Args:
+        sparql_query: SPARQL query to execute
+
+    Yields:
+        One binding dictionary per result row
+    """
+    full_query = _prepend_prefixes(sparql_query)
+
+    async with get_async_client().stream(
+        "POST",
+        WIKIDATA_SPARQL_ENDPOINT,
+        data={"query": full_query},
+        headers={"Accept": "application/sparql-results+json"},
+    ) as response:
+        response.raise_for_status()
+        reader = _AsyncByteReader(response.aiter_bytes())
+        async for binding in ijson.items(reader, "results.bindings.item"):
+            yield binding
 
 